@@ -4,6 +4,7 @@ from __future__ import annotations
 import os
 from pathlib import Path
 
+from src.config import get_settings
 from src.store import Store
 
 TEST_DB = "territory_test.db"
@@ -17,6 +18,7 @@ def main() -> None:
 
     # If your config reads DB_PATH, this makes it consistent for anything that uses get_settings()
     os.environ["DB_PATH"] = str(db_path)
+    get_settings.cache_clear()
 
     store = Store(db_path=str(db_path))
     store.init_schema()
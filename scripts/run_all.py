@@ -1,19 +1,40 @@
 from __future__ import annotations
 
+import asyncio
 import csv
 import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
 from pathlib import Path
 from typing import List, Set
 
+import httpx
+
+from src.config import get_settings
 from src.google_places import text_search, get_place_details
 from src.store import Store
-from src.classifier import classify_business, fetch_homepage_text
-from src.scoring import compute_score
+from src.classifier import (
+    Classification,
+    aclassify_business,
+    aclassify_businesses_batch,
+    afetch_homepage_text,
+    classification_cache_key,
+)
+from src.scoring import compute_scores_batch
+from src.utils.http import warmup
+from src.utils.ratelimit import RateLimiter
 
 
 DB_NAME = "territory.db"
 EXPORT_PATH = Path("data/exports/nl_full_ranked.csv")
 
+# Google fan-out: workers do the HTTP waits, limiter keeps us under Places QPS
+MAX_WORKERS = 12
+PLACES_QPS = 10.0
+
+# Flush DB upserts in batches so each commit covers many rows (one fsync)
+UPSERT_BATCH = 500
+
 # Full NL Coverage
 CITIES: List[str] = [
     "St. John's NL",
@@ -50,16 +71,173 @@ KEYWORDS: List[str] = [
 
 MAX_CLASSIFICATIONS = 200
 
+# Concurrent homepage+OpenAI pipelines; caps OpenAI QPS
+OPENAI_CONCURRENCY = 8
 
-def export_csv(rows, path: Path) -> None:
-    if not rows:
-        print("[EXPORT] No rows to export.")
-        return
+# Businesses classified per Responses call (one HTTP round-trip per chunk)
+AI_BATCH_SIZE = 10
 
-    path.parent.mkdir(parents=True, exist_ok=True)
 
-    dict_rows = [dict(r) for r in rows]
-    dict_rows.sort(key=lambda x: (x.get("total_score") or 0), reverse=True)
+def _make_async_client() -> httpx.AsyncClient:
+    # HTTP/2 when the h2 extra is installed; concurrent homepage fetches
+    # then multiplex over shared connections.
+    kwargs = dict(follow_redirects=True, timeout=60.0)
+    try:
+        return httpx.AsyncClient(http2=True, **kwargs)
+    except ImportError:
+        return httpx.AsyncClient(**kwargs)
+
+_limiter = RateLimiter(PLACES_QPS)
+
+
+# In-process dedupe: overlapping keyword x city searches and re-seen
+# place_ids cost zero extra quota within a run. lru_cache is thread-safe
+# for the worker-pool fan-out; misses pass through the rate limiter.
+@lru_cache(maxsize=1024)
+def _cached_search(query: str, max_pages: int):
+    _limiter.acquire()
+    return tuple(text_search(query, max_pages=max_pages))
+
+
+@lru_cache(maxsize=4096)
+def _cached_details(pid: str):
+    _limiter.acquire()
+    return get_place_details(pid)
+
+
+async def _classify_candidates(store: Store, candidates: list) -> int:
+    """
+    Run homepage fetch + OpenAI classification concurrently for each
+    candidate row. Workers only do network I/O; every DB write goes
+    through the single writer coroutine so SQLite sees one writer.
+    """
+    sem = asyncio.Semaphore(OPENAI_CONCURRENCY)
+    results: asyncio.Queue = asyncio.Queue()
+
+    async def worker(client: httpx.AsyncClient, chunk: list) -> None:
+        async with sem:
+            # (row, cache_key, classify_business kwargs) still needing OpenAI
+            pending = []
+
+            for r in chunk:
+                # Exact-match cache: same name/type/domain seen before -> no OpenAI call
+                cache_key = classification_cache_key(r["name"] or "", r["primary_type"], r["website"])
+                cached = store.get_cached_classification(cache_key)
+                if cached is not None:
+                    await results.put((r, Classification.model_validate_json(cached), None))
+                    continue
+
+                homepage_text = None
+                if r["website"]:
+                    try:
+                        homepage_text = await afetch_homepage_text(client, r["website"])
+                    except Exception:
+                        homepage_text = None
+
+                pending.append(
+                    (
+                        r,
+                        cache_key,
+                        {
+                            "name": r["name"] or "",
+                            "address": r["address"] or "",
+                            "primary_type": r["primary_type"],
+                            "website": r["website"],
+                            "homepage_text": homepage_text,
+                        },
+                    )
+                )
+
+            if not pending:
+                return
+
+            # One Responses call for the whole chunk; fall back to per-item
+            # mode if the batch fails (e.g. array-length mismatch).
+            try:
+                batch = await aclassify_businesses_batch(client, [item for _, _, item in pending])
+            except Exception as e:
+                print(f"[AI BATCH WARN] falling back to per-item: {e}")
+                batch = None
+
+            if batch is not None:
+                for (r, cache_key, _), result in zip(pending, batch):
+                    await results.put((r, result, cache_key))
+                return
+
+            for r, cache_key, item in pending:
+                try:
+                    result = await aclassify_business(client, **item)
+                except Exception as e:
+                    print(f"[AI ERROR] {r['name']} -> {e}")
+                    continue
+                await results.put((r, result, cache_key))
+
+    # (row, Classification) pairs accumulated by the writer; scored in one
+    # vectorized pass after all classifications land.
+    scored: list = []
+
+    async def writer() -> int:
+        classified = 0
+        while True:
+            item = await results.get()
+            if item is None:
+                return classified
+
+            r, result, cache_key = item
+            pid = r["place_id"]
+
+            if cache_key is not None:
+                store.put_cached_classification(cache_key, result.model_dump_json())
+
+            store.upsert_ai(
+                pid,
+                industry_bucket=result.industry_bucket,
+                mobility_fit=result.mobility_fit,
+                security_fit=result.security_fit,
+                voip_fit=result.voip_fit,
+                fleet_attach=result.fleet_attach,
+                signal_after_hours=result.signal_after_hours,
+                signal_dispatch=result.signal_dispatch,
+                signal_field_work=result.signal_field_work,
+                ai_reason=result.ai_reason,
+            )
+
+            scored.append((r, result))
+
+            classified += 1
+            print(f"[AI] {classified}/{len(candidates)} | {r['name']}")
+
+    chunks = [candidates[i : i + AI_BATCH_SIZE] for i in range(0, len(candidates), AI_BATCH_SIZE)]
+
+    async with _make_async_client() as client:
+        writer_task = asyncio.create_task(writer())
+        await asyncio.gather(*(worker(client, chunk) for chunk in chunks))
+        await results.put(None)
+        classified = await writer_task
+
+    if scored:
+        scores = compute_scores_batch(
+            mobility_fit=[res.mobility_fit for _, res in scored],
+            security_fit=[res.security_fit for _, res in scored],
+            voip_fit=[res.voip_fit for _, res in scored],
+            fleet_attach=[res.fleet_attach for _, res in scored],
+            rating=[r["rating"] for r, _ in scored],
+            review_count=[r["review_count"] for r, _ in scored],
+            has_website=[bool(r["website"]) for r, _ in scored],
+            has_opening_hours=[bool(r["opening_hours_json"]) for r, _ in scored],
+        )
+
+        store.upsert_scores_bulk(
+            (r["place_id"], float(s)) for (r, _), s in zip(scored, scores)
+        )
+
+        print(f"[SCORE] Batch-scored {len(scored)} places")
+
+    return classified
+
+
+def export_csv(rows, path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
 
     # Select readable columns in proper order
     columns = [
@@ -79,157 +257,149 @@ def export_csv(rows, path: Path) -> None:
         "ai_reason",
     ]
 
+    # Rows arrive pre-sorted from SQL; stream them straight to disk
+    # without building per-row dicts or a full in-memory list.
+    total = 0
+
+    def _tuples():
+        nonlocal total
+        for r in rows:
+            total += 1
+            yield tuple(r[c] for c in columns)
+
     with path.open("w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=columns, extrasaction="ignore")
-        writer.writeheader()
-        for r in dict_rows:
-            writer.writerow(r)
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        writer.writerows(_tuples())
+
+    if total == 0:
+        print("[EXPORT] No rows to export.")
+        return
 
     print(f"[EXPORT] Clean ranked list written to: {path.resolve()}")
-    print(f"[EXPORT] Total rows: {len(dict_rows)}")
+    print(f"[EXPORT] Total rows: {total}")
 
 
 def main():
     os.environ["DB_PATH"] = DB_NAME
+    get_settings.cache_clear()
 
     store = Store(db_path=DB_NAME)
     store.init_schema()
 
     print(f"[DB] Using: {Path(DB_NAME).resolve()}")
 
+    # Hot connection pool before the discovery fan-out starts
+    warmup()
+
     discovered_ids: Set[str] = set()
 
     # -----------------------------
     # DISCOVERY (Province Wide)
     # -----------------------------
-    for city in CITIES:
-        for kw in KEYWORDS:
-            query = f"{kw} in {city}"
-            print(f"\n[DISCOVERY] {query}")
+    # HTTP waits happen on worker threads; all DB upserts stay on this thread.
+    queries = [f"{kw} in {city}" for city in CITIES for kw in KEYWORDS]
+
+    batch: List[dict] = []
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
+        futures = {ex.submit(_cached_search, q, 3): q for q in queries}
+
+        for fut in as_completed(futures):
+            query = futures[fut]
 
             try:
-                places = text_search(query, max_pages=3)
+                places = fut.result()
             except Exception as e:
                 print(f"[DISCOVERY ERROR] {query} -> {e}")
                 continue
 
-            print(f"  -> found={len(places)}")
+            print(f"[DISCOVERY] {query} -> found={len(places)}")
 
             for p in places:
                 discovered_ids.add(p.place_id)
-                store.upsert_place(
-                    p.place_id,
-                    name=p.name,
-                    address=p.address,
-                    lat=p.lat,
-                    lng=p.lng,
-                    primary_type=p.primary_type,
-                    types=p.types,
-                    business_status=p.business_status,
+                batch.append(
+                    {
+                        "place_id": p.place_id,
+                        "name": p.name,
+                        "address": p.address,
+                        "lat": p.lat,
+                        "lng": p.lng,
+                        "primary_type": p.primary_type,
+                        "types": p.types,
+                        "business_status": p.business_status,
+                    }
                 )
 
+            if len(batch) >= UPSERT_BATCH:
+                store.upsert_places_many(batch)
+                batch.clear()
+
+    store.upsert_places_many(batch)
+    batch.clear()
+
     print(f"\n[DISCOVERY] Unique businesses discovered: {len(discovered_ids)}")
 
     # -----------------------------
     # DETAILS ENRICHMENT
     # -----------------------------
-    need_details = [pid for pid in discovered_ids if store.needs_details(pid)]
+    need_details = store.place_ids_needing_details(list(discovered_ids))
     print(f"[DETAILS] Needs enrichment: {len(need_details)}")
 
-    for idx, pid in enumerate(need_details, start=1):
-        try:
-            d = get_place_details(pid)
-            store.upsert_place(
-                d.place_id,
-                name=d.name,
-                address=d.address,
-                phone=d.phone,
-                website=d.website,
-                rating=d.rating,
-                review_count=d.review_count,
-                lat=d.lat,
-                lng=d.lng,
-                primary_type=d.primary_type,
-                types=d.types,
-                business_status=d.business_status,
-                maps_url=d.maps_url,
-                opening_hours_json=d.opening_hours_json,
-            )
-
-            if idx % 25 == 0 or idx == len(need_details):
-                print(f"[DETAILS] {idx}/{len(need_details)}")
-
-        except Exception as e:
-            print(f"[DETAILS ERROR] {pid} -> {e}")
-
-    # -----------------------------
-    # CLASSIFICATION (Max 200 NEW)
-    # -----------------------------
-    rows = store.fetch_rows_for_classification(limit=10000)
-
-    classified = 0
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
+        futures = {ex.submit(_cached_details, pid): pid for pid in need_details}
 
-    for r in rows:
-        if classified >= MAX_CLASSIFICATIONS:
-            break
+        done = 0
+        for fut in as_completed(futures):
+            pid = futures[fut]
 
-        pid = r["place_id"]
-
-        if not store.should_classify(pid, r["website"]):
-            continue
-
-        homepage_text = None
-        if r["website"]:
             try:
-                homepage_text = fetch_homepage_text(r["website"])
-            except Exception:
-                homepage_text = None
+                d = fut.result()
+            except Exception as e:
+                print(f"[DETAILS ERROR] {pid} -> {e}")
+                continue
 
-        try:
-            result = classify_business(
-                name=r["name"] or "",
-                address=r["address"] or "",
-                primary_type=r["primary_type"],
-                website=r["website"],
-                homepage_text=homepage_text,
+            batch.append(
+                {
+                    "place_id": d.place_id,
+                    "name": d.name,
+                    "address": d.address,
+                    "phone": d.phone,
+                    "website": d.website,
+                    "rating": d.rating,
+                    "review_count": d.review_count,
+                    "lat": d.lat,
+                    "lng": d.lng,
+                    "primary_type": d.primary_type,
+                    "types": d.types,
+                    "business_status": d.business_status,
+                    "maps_url": d.maps_url,
+                    "opening_hours_json": d.opening_hours_json,
+                }
             )
 
-            store.upsert_ai(
-                pid,
-                industry_bucket=result.industry_bucket,
-                mobility_fit=result.mobility_fit,
-                security_fit=result.security_fit,
-                voip_fit=result.voip_fit,
-                fleet_attach=result.fleet_attach,
-                signal_after_hours=result.signal_after_hours,
-                signal_dispatch=result.signal_dispatch,
-                signal_field_work=result.signal_field_work,
-                ai_reason=result.ai_reason,
-            )
+            if len(batch) >= UPSERT_BATCH:
+                store.upsert_places_many(batch)
+                batch.clear()
 
-            row2 = store.conn.execute(
-                "SELECT rating, review_count, website, opening_hours_json FROM places WHERE place_id=?",
-                (pid,),
-            ).fetchone()
+            done += 1
+            if done % 25 == 0 or done == len(need_details):
+                print(f"[DETAILS] {done}/{len(need_details)}")
 
-            score = compute_score(
-                mobility_fit=result.mobility_fit,
-                security_fit=result.security_fit,
-                voip_fit=result.voip_fit,
-                fleet_attach=result.fleet_attach,
-                rating=row2["rating"] if row2 else None,
-                review_count=row2["review_count"] if row2 else None,
-                has_website=bool(row2["website"]) if row2 else False,
-                has_opening_hours=bool(row2["opening_hours_json"]) if row2 else False,
-            )
+    store.upsert_places_many(batch)
+    batch.clear()
 
-            store.upsert_score(pid, score)
+    # -----------------------------
+    # CLASSIFICATION (Max 200 NEW)
+    # -----------------------------
+    rows = store.fetch_rows_for_classification(limit=10000)
 
-            classified += 1
-            print(f"[AI] {classified}/{MAX_CLASSIFICATIONS} | {r['name']} | Score={score:.1f}")
+    to_classify = store.should_classify_bulk([(r["place_id"], r["website"]) for r in rows])
+    candidates = [r for r in rows if r["place_id"] in to_classify]
+    candidates = candidates[:MAX_CLASSIFICATIONS]
+    print(f"[AI] Candidates to classify: {len(candidates)}")
 
-        except Exception as e:
-            print(f"[AI ERROR] {r['name']} -> {e}")
+    classified = asyncio.run(_classify_candidates(store, candidates))
 
     # -----------------------------
     # EXPORT CLEAN CSV
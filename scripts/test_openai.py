@@ -1,7 +1,7 @@
 # scripts/test_openai.py
 from __future__ import annotations
 
-import requests
+from src.classifier import _SESSION
 from src.config import get_settings
 
 RESPONSES_URL = "https://api.openai.com/v1/responses"
@@ -19,7 +19,7 @@ def main() -> None:
         "max_output_tokens": 16,  # minimum allowed
     }
 
-    r = requests.post(
+    r = _SESSION.post(
         RESPONSES_URL,
         headers={
             "Authorization": f"Bearer {api_key}",
@@ -3,15 +3,32 @@ from __future__ import annotations
 
 import csv
 import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
 from pathlib import Path
 from typing import Dict, List, Set
 
+from src.config import get_settings
 from src.google_places import get_place_details, text_search
 from src.store import Store
-from src.classifier import classify_business, fetch_homepage_text
+from src.classifier import (
+    Classification,
+    classification_cache_key,
+    classify_business,
+    fetch_homepage_text,
+)
 from src.scoring import compute_score
+from src.utils.http import warmup
+from src.utils.ratelimit import RateLimiter
 
 TEST_DB = "territory_test.db"
+
+# Small fan-out for the sanity run; limiter keeps us under Places QPS
+MAX_WORKERS = 8
+PLACES_QPS = 10.0
+
+# Flush DB upserts in batches so each commit covers many rows (one fsync)
+UPSERT_BATCH = 500
 EXPORT_PATH = Path("data/exports/stjohns_test.csv")
 
 # Keep this small for sanity test
@@ -30,32 +47,54 @@ KEYWORDS: List[str] = [
 
 MAX_CLASSIFICATIONS = 50
 
+_limiter = RateLimiter(PLACES_QPS)
 
-def export_csv(rows, path: Path) -> None:
-    if not rows:
-        print("[EXPORT] No rows to export.")
-        return
 
+# In-process dedupe: repeated queries / re-seen place_ids cost zero extra
+# quota within a run; misses pass through the rate limiter.
+@lru_cache(maxsize=1024)
+def _cached_search(query: str, max_pages: int):
+    _limiter.acquire()
+    return tuple(text_search(query, max_pages=max_pages))
+
+
+@lru_cache(maxsize=4096)
+def _cached_details(pid: str):
+    _limiter.acquire()
+    return get_place_details(pid)
+
+
+def export_csv(rows, path: Path) -> None:
     path.parent.mkdir(parents=True, exist_ok=True)
 
-    # sqlite3.Row supports dict(row)
-    dict_rows = [dict(r) for r in rows]
+    # Rows arrive pre-sorted from SQL; stream full-width tuples to disk
+    # (no per-row dicts, no key lookups per column).
+    columns = [d[0] for d in rows.description]
 
-    # Sort by score descending (None treated as 0)
-    dict_rows.sort(key=lambda x: (x.get("total_score") or 0), reverse=True)
+    total = 0
+
+    def _tuples():
+        nonlocal total
+        for r in rows:
+            total += 1
+            yield tuple(r)
 
     with path.open("w", newline="", encoding="utf-8") as f:
-        w = csv.DictWriter(f, fieldnames=list(dict_rows[0].keys()))
-        w.writeheader()
-        for r in dict_rows:
-            w.writerow(r)
+        w = csv.writer(f)
+        w.writerow(columns)
+        w.writerows(_tuples())
 
-    print(f"[EXPORT] Wrote: {path.resolve()} | rows={len(dict_rows)}")
+    if total == 0:
+        print("[EXPORT] No rows to export.")
+        return
+
+    print(f"[EXPORT] Wrote: {path.resolve()} | rows={total}")
 
 
 def main() -> None:
     # Force test DB without touching your main DB
     os.environ["DB_PATH"] = TEST_DB
+    get_settings.cache_clear()
 
     # (Optional) start clean each run
     # If you want to keep results between runs, comment these 2 lines.
@@ -67,152 +106,206 @@ def main() -> None:
     store.init_schema()
     print(f"[DB] Ready: {Path(TEST_DB).resolve()}")
 
+    # Hot connection pool before the discovery fan-out starts
+    warmup()
+
     # -------------------------
     # 1) DISCOVERY (St. John's only)
     # -------------------------
+    # Searches run on worker threads; all upserts stay on this thread.
     all_place_ids: Set[str] = set()
+    batch: List[dict] = []
 
-    for i, kw in enumerate(KEYWORDS, start=1):
-        q = f"{kw} in {CITY_QUERY}"
-        print(f"\n[DISCOVERY {i}/{len(KEYWORDS)}] {q}")
-
-        try:
-            places = text_search(q, max_pages=2)
-        except Exception as e:
-            print(f"  [DISCOVERY ERROR] {q} -> {e}")
-            continue
-
-        print(f"  -> found={len(places)}")
-
-        for p in places:
-            all_place_ids.add(p.place_id)
-            store.upsert_place(
-                p.place_id,
-                name=p.name,
-                address=p.address,
-                lat=p.lat,
-                lng=p.lng,
-                primary_type=p.primary_type,
-                types=p.types,
-                business_status=p.business_status,
-            )
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
+        futures = {ex.submit(_cached_search, f"{kw} in {CITY_QUERY}", 2): kw for kw in KEYWORDS}
+
+        done = 0
+        for fut in as_completed(futures):
+            kw = futures[fut]
+            q = f"{kw} in {CITY_QUERY}"
+            done += 1
+            print(f"\n[DISCOVERY {done}/{len(KEYWORDS)}] {q}")
+
+            try:
+                places = fut.result()
+            except Exception as e:
+                print(f"  [DISCOVERY ERROR] {q} -> {e}")
+                continue
+
+            print(f"  -> found={len(places)}")
+
+            for p in places:
+                all_place_ids.add(p.place_id)
+                batch.append(
+                    {
+                        "place_id": p.place_id,
+                        "name": p.name,
+                        "address": p.address,
+                        "lat": p.lat,
+                        "lng": p.lng,
+                        "primary_type": p.primary_type,
+                        "types": p.types,
+                        "business_status": p.business_status,
+                    }
+                )
+
+            if len(batch) >= UPSERT_BATCH:
+                store.upsert_places_many(batch)
+                batch.clear()
+
+    store.upsert_places_many(batch)
+    batch.clear()
 
     print(f"\n[DISCOVERY] Unique places collected: {len(all_place_ids)}")
 
     # -------------------------
     # 2) ENRICH DETAILS (phone/maps_url are "call-ready essentials")
     # -------------------------
-    need_details = [pid for pid in all_place_ids if store.needs_details(pid)]
+    need_details = store.place_ids_needing_details(list(all_place_ids))
     print(f"[DETAILS] Needs details: {len(need_details)}")
 
-    for idx, pid in enumerate(need_details, start=1):
-        try:
-            d = get_place_details(pid)
-            store.upsert_place(
-                d.place_id,
-                name=d.name,
-                address=d.address,
-                phone=d.phone,
-                website=d.website,
-                rating=d.rating,
-                review_count=d.review_count,
-                lat=d.lat,
-                lng=d.lng,
-                primary_type=d.primary_type,
-                types=d.types,
-                business_status=d.business_status,
-                maps_url=d.maps_url,
-                opening_hours_json=d.opening_hours_json,
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
+        futures = {ex.submit(_cached_details, pid): pid for pid in need_details}
+
+        done = 0
+        for fut in as_completed(futures):
+            pid = futures[fut]
+
+            try:
+                d = fut.result()
+            except Exception as e:
+                print(f"  [DETAILS ERROR] {pid} -> {e}")
+                continue
+
+            batch.append(
+                {
+                    "place_id": d.place_id,
+                    "name": d.name,
+                    "address": d.address,
+                    "phone": d.phone,
+                    "website": d.website,
+                    "rating": d.rating,
+                    "review_count": d.review_count,
+                    "lat": d.lat,
+                    "lng": d.lng,
+                    "primary_type": d.primary_type,
+                    "types": d.types,
+                    "business_status": d.business_status,
+                    "maps_url": d.maps_url,
+                    "opening_hours_json": d.opening_hours_json,
+                }
             )
-            if idx % 10 == 0 or idx == len(need_details):
-                print(f"  [DETAILS] progress {idx}/{len(need_details)}")
-        except Exception as e:
-            print(f"  [DETAILS ERROR] {pid} -> {e}")
+
+            if len(batch) >= UPSERT_BATCH:
+                store.upsert_places_many(batch)
+                batch.clear()
+
+            done += 1
+            if done % 10 == 0 or done == len(need_details):
+                print(f"  [DETAILS] progress {done}/{len(need_details)}")
+
+    store.upsert_places_many(batch)
+    batch.clear()
 
     # -------------------------
     # 3) CLASSIFY (max 50)
     # -------------------------
     rows = store.fetch_rows_for_classification(limit=5000)
-    print(f"\n[AI] Candidates in DB: {len(rows)} | Target classifications: {MAX_CLASSIFICATIONS}")
+
+    to_classify = store.should_classify_bulk([(r["place_id"], r["website"]) for r in rows])
+    all_candidates = [r for r in rows if r["place_id"] in to_classify]
+    classified_skip = len(rows) - len(all_candidates)
+    candidates = all_candidates[:MAX_CLASSIFICATIONS]
+    print(f"\n[AI] Candidates in DB: {len(rows)} | Target classifications: {len(candidates)}")
 
     classified_ok = 0
     classified_fail = 0
-    classified_skip = 0
-
-    for idx, r in enumerate(rows, start=1):
-        if classified_ok >= MAX_CLASSIFICATIONS:
-            break
-
-        pid = r["place_id"]
-        name = r["name"] or ""
-        website = r["website"]
 
-        if not store.should_classify(pid, website):
-            classified_skip += 1
-            continue
+    # Prefetch homepages on a thread pool so row N+1's download overlaps
+    # row N's OpenAI call. Cache hits never need the homepage at all.
+    cache_hits: Dict[str, str] = {}
+    cache_keys: Dict[str, str] = {}
+    homepage_futs: Dict[str, object] = {}
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
+        for r in candidates:
+            pid = r["place_id"]
+            cache_keys[pid] = classification_cache_key(r["name"] or "", r["primary_type"], r["website"])
+            cached = store.get_cached_classification(cache_keys[pid])
+            if cached is not None:
+                cache_hits[pid] = cached
+            elif r["website"]:
+                homepage_futs[pid] = ex.submit(fetch_homepage_text, r["website"])
+
+        for r in candidates:
+            pid = r["place_id"]
+            name = r["name"] or ""
+            website = r["website"]
+
+            cache_key = cache_keys[pid]
+            cached = cache_hits.get(pid)
+
+            homepage_text = None
+            if cached is None and pid in homepage_futs:
+                try:
+                    homepage_text = homepage_futs[pid].result(timeout=25)
+                except Exception as e:
+                    homepage_text = None
+                    print(f"  [WEB WARN] homepage fetch failed: {e}")
 
-        # Homepage fetch is optional (website can be None)
-        homepage_text = None
-        if website:
             try:
-                print(f"[AI {classified_ok + 1}/{MAX_CLASSIFICATIONS}] Fetch homepage: {name}")
-                homepage_text = fetch_homepage_text(website)
-            except Exception as e:
-                homepage_text = None
-                print(f"  [WEB WARN] homepage fetch failed: {e}")
-
-        try:
-            print(f"[AI {classified_ok + 1}/{MAX_CLASSIFICATIONS}] Classify: {name}")
-            result = classify_business(
-                name=name,
-                address=r["address"] or "",
-                primary_type=r["primary_type"],
-                website=website,
-                homepage_text=homepage_text,
-            )
-
-            store.upsert_ai(
-                pid,
-                industry_bucket=result.industry_bucket,
-                mobility_fit=result.mobility_fit,
-                security_fit=result.security_fit,
-                voip_fit=result.voip_fit,
-                fleet_attach=result.fleet_attach,
-                signal_after_hours=result.signal_after_hours,
-                signal_dispatch=result.signal_dispatch,
-                signal_field_work=result.signal_field_work,
-                ai_reason=result.ai_reason,
-            )
-
-            # Pull deterministic boosts from DB (rating/reviews/website/hours)
-            row2 = store.conn.execute(
-                "SELECT rating, review_count, website, opening_hours_json FROM places WHERE place_id=?",
-                (pid,),
-            ).fetchone()
-
-            score = compute_score(
-                mobility_fit=result.mobility_fit,
-                security_fit=result.security_fit,
-                voip_fit=result.voip_fit,
-                fleet_attach=result.fleet_attach,
-                rating=row2["rating"] if row2 else None,
-                review_count=row2["review_count"] if row2 else None,
-                has_website=bool(row2["website"]) if row2 else bool(website),
-                has_opening_hours=bool(row2["opening_hours_json"]) if row2 else False,
-            )
-
-            store.upsert_score(pid, score)
+                if cached is not None:
+                    print(f"[AI {classified_ok + 1}/{len(candidates)}] Cache hit: {name}")
+                    result = Classification.model_validate_json(cached)
+                else:
+                    print(f"[AI {classified_ok + 1}/{len(candidates)}] Classify: {name}")
+                    result = classify_business(
+                        name=name,
+                        address=r["address"] or "",
+                        primary_type=r["primary_type"],
+                        website=website,
+                        homepage_text=homepage_text,
+                    )
+                    store.put_cached_classification(cache_key, result.model_dump_json())
+
+                store.upsert_ai(
+                    pid,
+                    industry_bucket=result.industry_bucket,
+                    mobility_fit=result.mobility_fit,
+                    security_fit=result.security_fit,
+                    voip_fit=result.voip_fit,
+                    fleet_attach=result.fleet_attach,
+                    signal_after_hours=result.signal_after_hours,
+                    signal_dispatch=result.signal_dispatch,
+                    signal_field_work=result.signal_field_work,
+                    ai_reason=result.ai_reason,
+                )
+
+                # Deterministic boosts (rating/reviews/website/hours) ride along
+                # on the classification row, so no second SELECT per place.
+                score = compute_score(
+                    mobility_fit=result.mobility_fit,
+                    security_fit=result.security_fit,
+                    voip_fit=result.voip_fit,
+                    fleet_attach=result.fleet_attach,
+                    rating=r["rating"],
+                    review_count=r["review_count"],
+                    has_website=bool(website),
+                    has_opening_hours=bool(r["opening_hours_json"]),
+                )
+
+                store.upsert_score(pid, score)
+
+                classified_ok += 1
+                print(
+                    f"  [AI OK] score={score:.1f} | "
+                    f"M={result.mobility_fit} S={result.security_fit} V={result.voip_fit} F={result.fleet_attach} | "
+                    f"{name}"
+                )
 
-            classified_ok += 1
-            print(
-                f"  [AI OK] score={score:.1f} | "
-                f"M={result.mobility_fit} S={result.security_fit} V={result.voip_fit} F={result.fleet_attach} | "
-                f"{name}"
-            )
-
-        except Exception as e:
-            classified_fail += 1
-            print(f"  [AI ERROR] {name} -> {e}")
+            except Exception as e:
+                classified_fail += 1
+                print(f"  [AI ERROR] {name} -> {e}")
 
     # -------------------------
     # 4) EXPORT
@@ -1,17 +1,38 @@
 # src/classifier.py
 from __future__ import annotations
 
-import json
+import hashlib
 import re
 from typing import Any, Dict, Optional
+from urllib.parse import urlparse
 
+import httpx
+import orjson
 import requests
-from pydantic import BaseModel, Field, conint, ValidationError
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from pydantic import BaseModel, Field, conint
 
 from src.config import get_settings
 
 OPENAI_RESPONSES_URL = "https://api.openai.com/v1/responses"
 
+# One session for homepage fetches + OpenAI calls:
+# keep-alive amortizes TCP/TLS setup across the whole classification run.
+_SESSION = requests.Session()
+_SESSION.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=32,
+        pool_maxsize=32,
+        max_retries=Retry(
+            total=2,
+            backoff_factor=0.3,
+            status_forcelist=[429, 500, 502, 503, 504],
+        ),
+    ),
+)
+
 
 class Classification(BaseModel):
     industry_bucket: str
@@ -28,22 +49,122 @@ class Classification(BaseModel):
     ai_reason: str = Field(..., max_length=400)
 
 
+# Compiled once; _html_to_text runs these over ~10KB of HTML per homepage
+_RE_SCRIPT = re.compile(r"<script.*?>.*?</script>", re.IGNORECASE | re.DOTALL)
+_RE_STYLE = re.compile(r"<style.*?>.*?</style>", re.IGNORECASE | re.DOTALL)
+_RE_TAG = re.compile(r"<.*?>", re.DOTALL)
+_RE_WS = re.compile(r"\s+")
+_RE_FENCE_HEAD = re.compile(r"^```[a-zA-Z]*\s*")
+_RE_FENCE_TAIL = re.compile(r"\s*```$")
+_RE_JSON_OBJ = re.compile(r"\{.*\}", re.DOTALL)
+_RE_JSON_ARR = re.compile(r"\[.*\]", re.DOTALL)
+_RE_NUM = re.compile(r"-?\d+(\.\d+)?")
+
+
+# C-backed HTML parser beats regex stripping by 5-20x on real pages;
+# fall back to the regex pipeline when selectolax is not installed.
+try:
+    from selectolax.parser import HTMLParser as _HTMLParser
+except ImportError:
+    _HTMLParser = None
+
+
 # -----------------------------
 # Homepage fetch (single page)
 # -----------------------------
 def _html_to_text(html: str) -> str:
-    html = re.sub(r"(?is)<script.*?>.*?</script>", " ", html)
-    html = re.sub(r"(?is)<style.*?>.*?</style>", " ", html)
-    text = re.sub(r"(?s)<.*?>", " ", html)
-    text = re.sub(r"\s+", " ", text).strip()
+    if _HTMLParser is not None:
+        tree = _HTMLParser(html)
+        for node in tree.css("script,style"):
+            node.decompose()
+        # separator keeps words from adjacent elements from merging
+        return " ".join(tree.text(separator=" ").split())
+
+    html = _RE_SCRIPT.sub(" ", html)
+    html = _RE_STYLE.sub(" ", html)
+    text = _RE_TAG.sub(" ", html)
+    text = _RE_WS.sub(" ", text).strip()
     return text
 
 
+_FETCH_HEADERS = {"User-Agent": "territory-intel/1.0", "Accept": "text/html,application/xhtml+xml"}
+
+# Homepage fetches go over httpx with HTTP/2 when the h2 extra is present:
+# most business sites sit behind CDNs that negotiate h2, letting parallel
+# fetches multiplex one connection instead of holding a socket each.
+def _make_httpx_client() -> httpx.Client:
+    kwargs = dict(
+        timeout=httpx.Timeout(20.0),
+        follow_redirects=True,
+        limits=httpx.Limits(max_connections=32, max_keepalive_connections=32),
+    )
+    try:
+        return httpx.Client(http2=True, **kwargs)
+    except ImportError:
+        return httpx.Client(**kwargs)
+
+
+_HTTPX = _make_httpx_client()
+
+# Read at most this many raw bytes per homepage; a multi-MB marketing page
+# gets truncated to max_chars anyway, so never download the whole thing.
+_FETCH_BYTES_PER_CHAR = 20
+
+
+def _is_texty(content_type: str) -> bool:
+    return (not content_type) or content_type.startswith("text/") or "html" in content_type
+
+
 def fetch_homepage_text(website_url: str, *, timeout: int = 20, max_chars: int = 10_000) -> str:
-    headers = {"User-Agent": "territory-intel/1.0", "Accept": "text/html,application/xhtml+xml"}
-    r = requests.get(website_url, headers=headers, timeout=timeout, allow_redirects=True)
-    r.raise_for_status()
-    text = _html_to_text(r.text)
+    with _HTTPX.stream(
+        "GET", website_url, headers=_FETCH_HEADERS, timeout=timeout, follow_redirects=True
+    ) as r:
+        r.raise_for_status()
+
+        if not _is_texty(r.headers.get("Content-Type", "")):
+            return ""
+
+        limit = max_chars * _FETCH_BYTES_PER_CHAR
+        chunks: list[bytes] = []
+        read = 0
+        for chunk in r.iter_bytes():
+            chunks.append(chunk)
+            read += len(chunk)
+            if read >= limit:
+                break
+        html = b"".join(chunks).decode(r.encoding or "utf-8", errors="replace")
+
+    text = _html_to_text(html)
+    return text[:max_chars]
+
+
+async def afetch_homepage_text(
+    client: httpx.AsyncClient,
+    website_url: str,
+    *,
+    timeout: int = 20,
+    max_chars: int = 10_000,
+) -> str:
+    """Async twin of fetch_homepage_text (caller owns the httpx.AsyncClient)."""
+    async with client.stream(
+        "GET", website_url, headers=_FETCH_HEADERS, timeout=timeout, follow_redirects=True
+    ) as r:
+        r.raise_for_status()
+
+        if not _is_texty(r.headers.get("Content-Type", "")):
+            return ""
+
+        limit = max_chars * _FETCH_BYTES_PER_CHAR
+        chunks: list[bytes] = []
+        read = 0
+        async for chunk in r.aiter_bytes():
+            chunks.append(chunk)
+            read += len(chunk)
+            if read >= limit:
+                break
+        html = b"".join(chunks).decode(r.encoding or "utf-8", errors="replace")
+
+    text = _html_to_text(html)
     return text[:max_chars]
 
 
@@ -51,8 +172,18 @@ def fetch_homepage_text(website_url: str, *, timeout: int = 20, max_chars: int =
 # Response parsing + repair
 # -----------------------------
 def _extract_output_text(resp_json: Dict[str, Any]) -> str:
+    out = resp_json.get("output") or []
+
+    # Fast path: single message, single output_text block (the common case)
+    if len(out) == 1:
+        content = out[0].get("content") or []
+        if len(content) == 1:
+            c = content[0]
+            if c.get("type") == "output_text" and isinstance(c.get("text"), str):
+                return c["text"].strip()
+
     parts: list[str] = []
-    for item in resp_json.get("output", []) or []:
+    for item in out:
         for c in item.get("content", []) or []:
             if c.get("type") == "output_text" and isinstance(c.get("text"), str):
                 t = c["text"].strip()
@@ -64,8 +195,8 @@ def _extract_output_text(resp_json: Dict[str, Any]) -> str:
 def _strip_fences(s: str) -> str:
     s = s.strip()
     if s.startswith("```"):
-        s = re.sub(r"^```[a-zA-Z]*\s*", "", s)
-        s = re.sub(r"\s*```$", "", s)
+        s = _RE_FENCE_HEAD.sub("", s)
+        s = _RE_FENCE_TAIL.sub("", s)
     return s.strip()
 
 
@@ -74,7 +205,7 @@ def _extract_first_json_object(s: str) -> str:
     If model returns extra text, pull the first {...} JSON object.
     """
     s = _strip_fences(s)
-    m = re.search(r"\{.*\}", s, flags=re.DOTALL)
+    m = _RE_JSON_OBJ.search(s)
     if not m:
         return s
     return m.group(0).strip()
@@ -90,7 +221,7 @@ def _to_int(x: Any, *, lo: int, hi: int) -> int:
         v = int(round(float(x)))
     elif isinstance(x, str):
         # extract first number in string (handles "85%" or "85/100")
-        m = re.search(r"-?\d+(\.\d+)?", x)
+        m = _RE_NUM.search(x)
         v = int(round(float(m.group(0)))) if m else lo
     else:
         v = lo
@@ -128,23 +259,75 @@ def _normalize(obj: Dict[str, Any]) -> Dict[str, Any]:
 
 
 # -----------------------------
-# Public API
+# Classification cache key
 # -----------------------------
-def classify_business(
+def _website_domain(website: Optional[str]) -> str:
+    if not website:
+        return ""
+    netloc = urlparse(website).netloc or website
+    netloc = netloc.lower()
+    return netloc[4:] if netloc.startswith("www.") else netloc
+
+
+def classification_cache_key(name: str, primary_type: Optional[str], website: Optional[str]) -> str:
+    """
+    Stable exact-match key for caching classification results.
+
+    Chains/franchises resurface across keyword x city searches with the same
+    name + type + domain; a hit skips the OpenAI call entirely.
+    """
+    raw = f"{name.lower().strip()}|{primary_type or ''}|{_website_domain(website)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+# -----------------------------
+# Request/response plumbing shared by sync + async paths
+# -----------------------------
+def _require_api_key() -> str:
+    api_key = get_settings().openai_api_key
+    if not api_key:
+        raise RuntimeError("OPENAI_API_KEY missing in .env")
+    return api_key
+
+
+# Kept byte-identical across requests so OpenAI's server-side prefix cache
+# hits on every call in a batch; only the user message varies.
+_SYSTEM_PROMPT = (
+    "Return ONLY valid JSON. No markdown. No extra text.\n"
+    "Keys required:\n"
+    "industry_bucket, mobility_fit, security_fit, voip_fit, fleet_attach,\n"
+    "signal_after_hours, signal_dispatch, signal_field_work, ai_reason.\n"
+    "Rules:\n"
+    "- fits are integers 0-100\n"
+    "- signals are integers 0 or 1\n"
+    "- ai_reason <= 400 chars\n"
+    "- Mobility is highest priority; Security then VoIP then Fleet.\n"
+)
+
+_BATCH_SYSTEM_PROMPT = (
+    "Return ONLY a valid JSON array. No markdown. No extra text.\n"
+    "The array must contain exactly one object per business, in the same order\n"
+    "as the input list. Each object requires keys:\n"
+    "industry_bucket, mobility_fit, security_fit, voip_fit, fleet_attach,\n"
+    "signal_after_hours, signal_dispatch, signal_field_work, ai_reason.\n"
+    "Rules:\n"
+    "- fits are integers 0-100\n"
+    "- signals are integers 0 or 1\n"
+    "- ai_reason <= 400 chars\n"
+    "- Mobility is highest priority; Security then VoIP then Fleet.\n"
+)
+
+
+def _build_payload(
     *,
     name: str,
     address: str,
     primary_type: Optional[str],
     website: Optional[str],
     homepage_text: Optional[str],
-    model: str = "gpt-4.1-mini",
-    max_output_tokens: int = 250,
-) -> Classification:
-    s = get_settings()
-    api_key = s.openai_api_key
-    if not api_key:
-        raise RuntimeError("OPENAI_API_KEY missing in .env")
-
+    model: str,
+    max_output_tokens: int,
+) -> Dict[str, Any]:
     info = {
         "name": name,
         "address": address,
@@ -153,49 +336,200 @@ def classify_business(
         "homepage_text": homepage_text,
     }
 
-    prompt = (
-        "Return ONLY valid JSON. No markdown. No extra text.\n"
-        "Keys required:\n"
-        "industry_bucket, mobility_fit, security_fit, voip_fit, fleet_attach,\n"
-        "signal_after_hours, signal_dispatch, signal_field_work, ai_reason.\n"
-        "Rules:\n"
-        "- fits are integers 0-100\n"
-        "- signals are integers 0 or 1\n"
-        "- ai_reason <= 400 chars\n"
-        "- Mobility is highest priority; Security then VoIP then Fleet.\n\n"
-        f"Business:\n{json.dumps(info, ensure_ascii=False)}"
-    )
+    # Deterministic key order keeps the serialized form stable run-to-run
+    info_json = orjson.dumps(info, option=orjson.OPT_SORT_KEYS).decode()
 
-    payload: Dict[str, Any] = {
+    return {
         "model": model,
-        "input": prompt,
+        "input": [
+            {"role": "system", "content": _SYSTEM_PROMPT},
+            {"role": "user", "content": f"Business:\n{info_json}"},
+        ],
         "max_output_tokens": max_output_tokens,
         "temperature": 0.2,
     }
 
-    r = requests.post(
+
+def _parse_classification(resp_json: Dict[str, Any]) -> Classification:
+    raw_text = _extract_output_text(resp_json)
+    raw_text = _extract_first_json_object(raw_text)
+
+    try:
+        parsed = orjson.loads(raw_text)
+    except orjson.JSONDecodeError:
+        # If JSON parse fails, hard fail with useful snippet
+        raise RuntimeError(f"Classifier output not parseable as JSON: {raw_text[:500]}")
+
+    if not isinstance(parsed, dict):
+        raise RuntimeError(f"Classifier output is not a JSON object: {raw_text[:500]}")
+
+    # _normalize already clamps every field into schema range, so skip
+    # pydantic validators entirely and construct directly.
+    return Classification.model_construct(**_normalize(parsed))
+
+
+def _build_batch_payload(
+    items: list,
+    *,
+    model: str,
+    max_output_tokens_per_item: int,
+) -> Dict[str, Any]:
+    items_json = orjson.dumps(items, option=orjson.OPT_SORT_KEYS).decode()
+    return {
+        "model": model,
+        "input": [
+            {"role": "system", "content": _BATCH_SYSTEM_PROMPT},
+            {"role": "user", "content": f"Businesses:\n{items_json}"},
+        ],
+        "max_output_tokens": max_output_tokens_per_item * len(items),
+        "temperature": 0.2,
+    }
+
+
+def _parse_classification_array(resp_json: Dict[str, Any], expected: int) -> list:
+    raw_text = _strip_fences(_extract_output_text(resp_json))
+    m = _RE_JSON_ARR.search(raw_text)
+    if m:
+        raw_text = m.group(0)
+
+    try:
+        parsed = orjson.loads(raw_text)
+    except orjson.JSONDecodeError:
+        raise RuntimeError(f"Batch classifier output not parseable as JSON: {raw_text[:500]}")
+
+    if not isinstance(parsed, list) or len(parsed) != expected:
+        got = len(parsed) if isinstance(parsed, list) else type(parsed).__name__
+        raise RuntimeError(f"Batch classifier output length mismatch: expected {expected}, got {got}")
+
+    return [
+        Classification.model_construct(**_normalize(o if isinstance(o, dict) else {}))
+        for o in parsed
+    ]
+
+
+# -----------------------------
+# Public API
+# -----------------------------
+def classify_business(
+    *,
+    name: str,
+    address: str,
+    primary_type: Optional[str],
+    website: Optional[str],
+    homepage_text: Optional[str],
+    model: str = "gpt-4.1-mini",
+    max_output_tokens: int = 250,
+) -> Classification:
+    api_key = _require_api_key()
+
+    payload = _build_payload(
+        name=name,
+        address=address,
+        primary_type=primary_type,
+        website=website,
+        homepage_text=homepage_text,
+        model=model,
+        max_output_tokens=max_output_tokens,
+    )
+
+    r = _SESSION.post(
         OPENAI_RESPONSES_URL,
         headers={"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"},
-        json=payload,
+        data=orjson.dumps(payload),
         timeout=60,
     )
 
     if r.status_code != 200:
         raise RuntimeError(f"OpenAI error {r.status_code}: {r.text[:1200]}")
 
-    raw_text = _extract_output_text(r.json())
-    raw_text = _extract_first_json_object(raw_text)
+    return _parse_classification(orjson.loads(r.content))
 
-    # 1) try strict
-    try:
-        return Classification.model_validate_json(raw_text)
-    except ValidationError:
-        # 2) repair path: parse -> normalize -> validate
-        try:
-            parsed = json.loads(raw_text)
-        except Exception:
-            # If JSON parse fails, hard fail with useful snippet
-            raise RuntimeError(f"Classifier output not parseable as JSON: {raw_text[:500]}")
-
-        normalized = _normalize(parsed)
-        return Classification.model_validate(normalized)
\ No newline at end of file
+
+async def aclassify_business(
+    client: httpx.AsyncClient,
+    *,
+    name: str,
+    address: str,
+    primary_type: Optional[str],
+    website: Optional[str],
+    homepage_text: Optional[str],
+    model: str = "gpt-4.1-mini",
+    max_output_tokens: int = 250,
+) -> Classification:
+    """Async twin of classify_business (caller owns the httpx.AsyncClient)."""
+    api_key = _require_api_key()
+
+    payload = _build_payload(
+        name=name,
+        address=address,
+        primary_type=primary_type,
+        website=website,
+        homepage_text=homepage_text,
+        model=model,
+        max_output_tokens=max_output_tokens,
+    )
+
+    r = await client.post(
+        OPENAI_RESPONSES_URL,
+        headers={"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"},
+        content=orjson.dumps(payload),
+        timeout=60,
+    )
+
+    if r.status_code != 200:
+        raise RuntimeError(f"OpenAI error {r.status_code}: {r.text[:1200]}")
+
+    return _parse_classification(orjson.loads(r.content))
+
+
+def classify_businesses_batch(
+    items: list,
+    *,
+    model: str = "gpt-4.1-mini",
+    max_output_tokens_per_item: int = 250,
+) -> list:
+    """
+    Classify several businesses with ONE Responses call.
+
+    items: dicts with name/address/primary_type/website/homepage_text.
+    Returns one Classification per item, same order. Raises on an
+    array-length mismatch so callers can fall back to per-item mode.
+    """
+    api_key = _require_api_key()
+    payload = _build_batch_payload(items, model=model, max_output_tokens_per_item=max_output_tokens_per_item)
+
+    r = _SESSION.post(
+        OPENAI_RESPONSES_URL,
+        headers={"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"},
+        data=orjson.dumps(payload),
+        timeout=120,
+    )
+
+    if r.status_code != 200:
+        raise RuntimeError(f"OpenAI error {r.status_code}: {r.text[:1200]}")
+
+    return _parse_classification_array(orjson.loads(r.content), expected=len(items))
+
+
+async def aclassify_businesses_batch(
+    client: httpx.AsyncClient,
+    items: list,
+    *,
+    model: str = "gpt-4.1-mini",
+    max_output_tokens_per_item: int = 250,
+) -> list:
+    """Async twin of classify_businesses_batch."""
+    api_key = _require_api_key()
+    payload = _build_batch_payload(items, model=model, max_output_tokens_per_item=max_output_tokens_per_item)
+
+    r = await client.post(
+        OPENAI_RESPONSES_URL,
+        headers={"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"},
+        content=orjson.dumps(payload),
+        timeout=120,
+    )
+
+    if r.status_code != 200:
+        raise RuntimeError(f"OpenAI error {r.status_code}: {r.text[:1200]}")
+
+    return _parse_classification_array(orjson.loads(r.content), expected=len(items))
\ No newline at end of file
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import functools
 import os
 from dataclasses import dataclass
 from pathlib import Path
@@ -14,7 +15,11 @@ class Settings:
     google_maps_api_key: str | None
     openai_api_key: str | None
 
+@functools.lru_cache(maxsize=1)
 def get_settings() -> Settings:
+    # Memoized: Settings is frozen and env doesn't change mid-run.
+    # Scripts that mutate os.environ (e.g. DB_PATH) must call
+    # get_settings.cache_clear() afterwards.
     db_path = Path(os.getenv("DB_PATH", "territory.db")).resolve()
     log_level = os.getenv("LOG_LEVEL", "INFO").upper()
 
@@ -17,12 +17,22 @@ Design:
 
 from __future__ import annotations
 
+import asyncio
+import threading
 import time
-from dataclasses import dataclass
-from typing import Any, Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, fields
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Sequence
+
+import httpx
+import orjson
+from cachetools import TTLCache
 
 from src.config import get_settings
 from src.utils.http import get_json
+from src.utils.ratelimit import RateLimiter
 
 
 # -----------------------------
@@ -91,7 +101,7 @@ NL_LOCATION_BIAS = {
 # Models
 # -----------------------------
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class PlaceLite:
     """Lightweight result from discovery."""
     place_id: str
@@ -104,7 +114,7 @@ class PlaceLite:
     business_status: Optional[str]
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class PlaceDetails:
     """Enriched call-ready details for a place_id."""
     place_id: str
@@ -124,29 +134,110 @@ class PlaceDetails:
     business_status: Optional[str]
 
 
+# Field order for the columnar (struct-of-arrays) layout below
+_DETAILS_FIELDS = tuple(f.name for f in fields(PlaceDetails))
+
+
+def details_columns(details: Sequence[PlaceDetails]) -> Dict[str, List[Any]]:
+    """
+    Transpose enrichment results into parallel per-field lists
+    (struct-of-arrays), keyed by PlaceDetails field name.
+
+    Downstream bulk consumers want columns, not objects: the lists feed
+    scoring.compute_scores_batch and Store.upsert_places_many directly,
+    with no per-instance re-iteration or transpose pass.
+    """
+    cols: Dict[str, List[Any]] = {name: [] for name in _DETAILS_FIELDS}
+    for d in details:
+        for name in _DETAILS_FIELDS:
+            cols[name].append(getattr(d, name))
+    return cols
+
+
+def enrich_places_columnar(
+    places: List[PlaceLite],
+    *,
+    limit: Optional[int] = None,
+    max_workers: int = 8,
+    qps: Optional[float] = None,
+    log_failures: bool = True,
+) -> Dict[str, List[Any]]:
+    """enrich_places, but returning the columnar layout from details_columns."""
+    return details_columns(
+        enrich_places(
+            places,
+            limit=limit,
+            max_workers=max_workers,
+            qps=qps,
+            log_failures=log_failures,
+        )
+    )
+
+
+# -----------------------------
+# Settings access
+# -----------------------------
+
+_API_KEY: Optional[str] = None
+
+
+def _api_key() -> str:
+    """Resolve the Places API key once and memoize it for the process."""
+    global _API_KEY
+    if _API_KEY is None:
+        key = get_settings().google_maps_api_key
+        if not key:
+            raise RuntimeError("GOOGLE_MAPS_API_KEY is missing in .env")
+        _API_KEY = key
+    return _API_KEY
+
+
 # -----------------------------
 # Header builders
 # -----------------------------
 
-def _text_headers(api_key: str) -> Dict[str, str]:
-    return {
-        "X-Goog-Api-Key": api_key,
-        "X-Goog-FieldMask": TEXT_SEARCH_FIELD_MASK,
-        "Content-Type": "application/json; charset=utf-8",
-    }
+# Cached per api_key (there are at most a couple in one process) so the
+# fanned-out call sites don't rebuild the same dict per request. The
+# MappingProxyType wrapper keeps the cached mapping immutable.
+@lru_cache(maxsize=2)
+def _text_headers(api_key: str) -> Mapping[str, str]:
+    return MappingProxyType(
+        {
+            "X-Goog-Api-Key": api_key,
+            "X-Goog-FieldMask": TEXT_SEARCH_FIELD_MASK,
+            "Content-Type": "application/json; charset=utf-8",
+        }
+    )
 
 
-def _details_headers(api_key: str) -> Dict[str, str]:
-    return {
-        "X-Goog-Api-Key": api_key,
-        "X-Goog-FieldMask": DETAILS_FIELD_MASK,
-    }
+@lru_cache(maxsize=2)
+def _details_headers(api_key: str) -> Mapping[str, str]:
+    return MappingProxyType(
+        {
+            "X-Goog-Api-Key": api_key,
+            "X-Goog-FieldMask": DETAILS_FIELD_MASK,
+        }
+    )
 
 
 # -----------------------------
 # Parsers
 # -----------------------------
 
+def _as_float(v: Any) -> Optional[float]:
+    # JSON numbers already arrive as float/int; only coerce the odd
+    # string-typed value instead of paying float() on every field.
+    if v is None or type(v) is float:
+        return v
+    return float(v)
+
+
+def _as_int(v: Any) -> Optional[int]:
+    if v is None or type(v) is int:
+        return v
+    return int(v)
+
+
 def _parse_place_lite(p: Dict[str, Any]) -> PlaceLite:
     place_id = p.get("id") or ""
     name = (p.get("displayName") or {}).get("text") or ""
@@ -164,8 +255,8 @@ def _parse_place_lite(p: Dict[str, Any]) -> PlaceLite:
         place_id=place_id,
         name=name,
         address=address,
-        lat=float(lat) if lat is not None else None,
-        lng=float(lng) if lng is not None else None,
+        lat=_as_float(lat),
+        lng=_as_float(lng),
         primary_type=primary_type,
         types=list(types),
         business_status=business_status,
@@ -190,12 +281,12 @@ def _parse_place_details(d: Dict[str, Any]) -> PlaceDetails:
         address=address,
         phone=phone,
         website=d.get("websiteUri"),
-        rating=float(rating) if rating is not None else None,
-        review_count=int(review_count) if review_count is not None else None,
+        rating=_as_float(rating),
+        review_count=_as_int(review_count),
         maps_url=d.get("googleMapsUri"),
         opening_hours_json=d.get("regularOpeningHours"),
-        lat=float(loc.get("latitude")) if loc.get("latitude") is not None else None,
-        lng=float(loc.get("longitude")) if loc.get("longitude") is not None else None,
+        lat=_as_float(loc.get("latitude")),
+        lng=_as_float(loc.get("longitude")),
         primary_type=d.get("primaryType"),
         types=list(d.get("types") or []),
         business_status=d.get("businessStatus"),
@@ -206,7 +297,7 @@ def _parse_place_details(d: Dict[str, Any]) -> PlaceDetails:
 # Public API
 # -----------------------------
 
-def text_search(
+def text_search_iter(
     query: str,
     *,
     page_size: int = 20,
@@ -219,19 +310,16 @@ def text_search(
     strict_type_filtering: bool = False,
     # Safety: pagination token can require a short delay before it becomes valid
     page_token_delay_seconds: float = 2.0,
-) -> List[PlaceLite]:
+) -> Iterator[PlaceLite]:
     """
-    Perform Places API (New) Text Search.
+    Perform Places API (New) Text Search, yielding deduped PlaceLite
+    results as each page parses.
 
-    Returns:
-      List[PlaceLite]
+    Callers can start enriching/upserting page-1 results while the
+    2s page-token delay for page 2 is still ticking, instead of
+    blocking until every page has been fetched.
     """
-    s = get_settings()
-    api_key = s.google_maps_api_key
-    if not api_key:
-        raise RuntimeError("GOOGLE_MAPS_API_KEY is missing in .env")
-
-    headers = _text_headers(api_key)
+    headers = _text_headers(_api_key())
 
     payload: Dict[str, Any] = {
         "textQuery": query,
@@ -248,11 +336,10 @@ def text_search(
         payload["includedType"] = included_type
         payload["strictTypeFiltering"] = bool(strict_type_filtering)
 
-    results: List[PlaceLite] = []
     seen: set[str] = set()
     page_token: Optional[str] = None
 
-    for _ in range(max_pages):
+    for page_index in range(max_pages):
         if page_token:
             payload["pageToken"] = page_token
         else:
@@ -270,41 +357,143 @@ def text_search(
             place = _parse_place_lite(p)
             if place.place_id and place.place_id not in seen:
                 seen.add(place.place_id)
-                results.append(place)
+                yield place
 
         page_token = data.get("nextPageToken")
         if not page_token:
             break
 
-        # Safety: token often needs a short delay before it is accepted
-        if page_token_delay_seconds and page_token_delay_seconds > 0:
+        # Safety: token often needs a short delay before it is accepted.
+        # No point sleeping when the page cap means we won't use it.
+        if page_index < max_pages - 1 and page_token_delay_seconds and page_token_delay_seconds > 0:
             time.sleep(page_token_delay_seconds)
 
-    return results
+
+def text_search(query: str, **kwargs: Any) -> List[PlaceLite]:
+    """
+    Materialized text_search_iter (same keyword arguments).
+
+    Returns:
+      List[PlaceLite]
+    """
+    return list(text_search_iter(query, **kwargs))
+
+
+# Cache-aside in front of get_place_details: re-runs and overlapping
+# discovery queries hit the same place_ids, and each hit is a full Google
+# API call we are billed for. Entries expire after a day so stale details
+# eventually refresh. The lock only guards cache access; a race between
+# two misses on the same pid at worst duplicates one fetch.
+_DETAILS_CACHE: TTLCache = TTLCache(maxsize=10_000, ttl=86400)
+_DETAILS_CACHE_LOCK = threading.Lock()
 
 
 def get_place_details(place_id: str) -> PlaceDetails:
     """
     Fetch Place Details (New) for a single place_id.
 
+    Results are cached in-process for 24h, so repeated lookups of the
+    same place_id cost zero API calls within a run.
+
     Returns:
       PlaceDetails with phone, website, hours, rating, etc.
     """
-    s = get_settings()
-    api_key = s.google_maps_api_key
-    if not api_key:
-        raise RuntimeError("GOOGLE_MAPS_API_KEY is missing in .env")
+    with _DETAILS_CACHE_LOCK:
+        cached = _DETAILS_CACHE.get(place_id)
+    if cached is not None:
+        return cached
 
     url = f"{PLACES_DETAILS_BASE_URL}{place_id}"
 
     data = get_json(
         url,
         method="GET",
-        headers=_details_headers(api_key),
+        headers=_details_headers(_api_key()),
         timeout=30,
     )
 
-    return _parse_place_details(data)
+    details = _parse_place_details(data)
+    with _DETAILS_CACHE_LOCK:
+        _DETAILS_CACHE[place_id] = details
+    return details
+
+
+# Statuses worth retrying on the async details path
+_RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+async def _aget_details(
+    client: httpx.AsyncClient,
+    place_id: str,
+    sem: asyncio.Semaphore,
+    headers: Mapping[str, str],
+    *,
+    max_attempts: int = 5,
+) -> PlaceDetails:
+    """One Place Details GET with exponential backoff on 429/5xx/transport errors."""
+    url = f"{PLACES_DETAILS_BASE_URL}{place_id}"
+    delay = 1.0
+
+    async with sem:
+        for attempt in range(1, max_attempts + 1):
+            err: Exception
+            try:
+                r = await client.get(url, headers=headers, timeout=30)
+            except httpx.TransportError as e:
+                err = e
+            else:
+                if r.status_code == 200:
+                    return _parse_place_details(orjson.loads(r.content))
+                err = RuntimeError(f"HTTP {r.status_code}: {r.text[:300]}")
+                if r.status_code not in _RETRY_STATUS:
+                    raise err
+
+            if attempt == max_attempts:
+                raise err
+
+            await asyncio.sleep(delay)
+            delay = min(delay * 2.0, 20.0)
+
+    raise AssertionError("unreachable")
+
+
+def enrich_places_async(
+    places: List[PlaceLite],
+    *,
+    limit: Optional[int] = None,
+    max_concurrency: int = 10,
+    log_failures: bool = True,
+) -> List[PlaceDetails]:
+    """
+    Concurrent variant of enrich_places.
+
+    All Place Details GETs share one AsyncClient behind a semaphore-gated
+    sliding window: every completion immediately frees a slot for the next
+    request, so wall time is roughly ceil(N / max_concurrency) round-trips
+    instead of N.
+
+    Failures are filtered out (and optionally logged) like enrich_places.
+    """
+    headers = _details_headers(_api_key())
+    n = len(places) if limit is None else min(len(places), limit)
+    pids = [p.place_id for p in places[:n] if p.place_id]
+
+    async def _gather() -> list:
+        sem = asyncio.Semaphore(max_concurrency)
+        async with httpx.AsyncClient() as client:
+            tasks = [_aget_details(client, pid, sem, headers) for pid in pids]
+            return await asyncio.gather(*tasks, return_exceptions=True)
+
+    results = asyncio.run(_gather())
+
+    enriched: List[PlaceDetails] = []
+    for pid, res in zip(pids, results):
+        if isinstance(res, BaseException):
+            if log_failures:
+                print(f"[enrich_places_async] Failed place_id={pid}: {res}")
+            continue
+        enriched.append(res)
+    return enriched
 
 
 def enrich_places(
@@ -312,35 +501,52 @@ def enrich_places(
     *,
     limit: Optional[int] = None,
     # Safety knobs:
-    sleep_seconds: float = 0.0,
+    max_workers: int = 8,
+    qps: Optional[float] = None,
     log_failures: bool = True,
 ) -> List[PlaceDetails]:
     """
     Convenience helper:
     Take discovery results and enrich each place_id via Place Details.
 
+    Details GETs fan out over a thread pool (each thread shares the pooled
+    session in utils.http), so up to max_workers requests are in flight at
+    once instead of one.
+
     limit:
       Optional safety cap to avoid accidental huge runs while testing.
 
-    sleep_seconds:
-      Optional throttle between details requests (useful if you hit rate limits).
+    max_workers:
+      Concurrent details requests; network-bound, so ~8-16 is the sweet spot.
+
+    qps:
+      Optional token-bucket throttle shared across threads (replaces the old
+      per-request sleep_seconds), useful if you hit rate limits.
 
     log_failures:
       If True, prints a minimal message on a failed place_id (v1-friendly visibility).
     """
-    enriched: List[PlaceDetails] = []
     n = len(places) if limit is None else min(len(places), limit)
+    pids = [p.place_id for p in places[:n] if p.place_id]
 
-    for i in range(n):
-        pid = places[i].place_id
-        try:
-            enriched.append(get_place_details(pid))
-        except Exception as e:
-            if log_failures:
-                print(f"[enrich_places] Failed place_id={pid}: {e}")
-            continue
+    limiter = RateLimiter(qps) if qps else None
+
+    def _fetch(pid: str) -> PlaceDetails:
+        if limiter is not None:
+            limiter.acquire()
+        return get_place_details(pid)
+
+    enriched: List[PlaceDetails] = []
+
+    with ThreadPoolExecutor(max_workers=max_workers) as ex:
+        futures = {ex.submit(_fetch, pid): pid for pid in pids}
 
-        if sleep_seconds and sleep_seconds > 0:
-            time.sleep(sleep_seconds)
+        for fut in as_completed(futures):
+            pid = futures[fut]
+            try:
+                enriched.append(fut.result())
+            except Exception as e:
+                if log_failures:
+                    print(f"[enrich_places] Failed place_id={pid}: {e}")
 
     return enriched
\ No newline at end of file
@@ -1,12 +1,14 @@
 # src/store.py
 from __future__ import annotations
 
-import json
 import sqlite3
 from datetime import datetime, timezone
 from pathlib import Path
 from typing import Any, Dict, Iterable, List, Optional, Sequence, Set
 
+import orjson
+import xxhash
+
 from src.config import get_settings
 
 
@@ -14,6 +16,64 @@ def _utc_now_iso() -> str:
     return datetime.now(timezone.utc).replace(microsecond=0).isoformat()
 
 
+def _json_hash(payload: bytes) -> int:
+    # xxh64 of the serialized JSON, folded into SQLite's signed 64-bit
+    # INTEGER range.
+    h = xxhash.xxh64_intdigest(payload)
+    return h - (1 << 64) if h >= (1 << 63) else h
+
+
+# Shared by upsert_place (execute) and upsert_places_many (executemany).
+# COALESCE keeps existing values when an update carries None for a column.
+_UPSERT_PLACE_SQL = """
+    INSERT INTO places (
+        place_id, name, address, phone, website, rating, review_count,
+        lat, lng, primary_type, types_json, business_status,
+        maps_url, opening_hours_json, types_hash, hours_hash,
+        first_seen, last_seen
+    ) VALUES (
+        :place_id, :name, :address, :phone, :website, :rating, :review_count,
+        :lat, :lng, :primary_type, :types_json, :business_status,
+        :maps_url, :opening_hours_json, :types_hash, :hours_hash,
+        :now, :now
+    )
+    ON CONFLICT(place_id) DO UPDATE SET
+        last_seen = excluded.last_seen,
+
+        name = COALESCE(excluded.name, places.name),
+        address = COALESCE(excluded.address, places.address),
+        phone = COALESCE(excluded.phone, places.phone),
+        website = COALESCE(excluded.website, places.website),
+        rating = COALESCE(excluded.rating, places.rating),
+        review_count = COALESCE(excluded.review_count, places.review_count),
+        lat = COALESCE(excluded.lat, places.lat),
+        lng = COALESCE(excluded.lng, places.lng),
+        primary_type = COALESCE(excluded.primary_type, places.primary_type),
+        types_json = COALESCE(excluded.types_json, places.types_json),
+        business_status = COALESCE(excluded.business_status, places.business_status),
+        maps_url = COALESCE(excluded.maps_url, places.maps_url),
+        opening_hours_json = COALESCE(excluded.opening_hours_json, places.opening_hours_json),
+        types_hash = COALESCE(excluded.types_hash, places.types_hash),
+        hours_hash = COALESCE(excluded.hours_hash, places.hours_hash)
+    ;
+"""
+
+
+# Hot point-lookup statements, hoisted so sqlite3's statement cache keys
+# on the same string object instead of re-hashing a fresh literal per call.
+_NEEDS_DETAILS_SQL = """
+    SELECT (phone IS NULL OR maps_url IS NULL)
+    FROM places
+    WHERE place_id=?
+"""
+
+_AI_STATE_SQL = """
+    SELECT website, ai_last_updated, mobility_fit, security_fit, voip_fit, fleet_attach
+    FROM places
+    WHERE place_id=?
+"""
+
+
 class Store:
     """
     Persistence layer ONLY.
@@ -44,6 +104,9 @@ class Store:
         self.conn.execute("PRAGMA foreign_keys = ON;")
         self.conn.execute("PRAGMA journal_mode = WAL;")
         self.conn.execute("PRAGMA synchronous = NORMAL;")
+        self.conn.execute("PRAGMA cache_size = -65536;")      # 64MB page cache
+        self.conn.execute("PRAGMA temp_store = MEMORY;")
+        self.conn.execute("PRAGMA mmap_size = 268435456;")    # 256MB mmap window
 
     def close(self) -> None:
         self.conn.close()
@@ -69,6 +132,12 @@ class Store:
                 business_status TEXT,
                 maps_url TEXT,
                 opening_hours_json TEXT,
+
+                -- xxh64 of the serialized types/hours JSON; lets upserts
+                -- skip re-writing unchanged payloads on re-scans
+                types_hash INTEGER,
+                hours_hash INTEGER,
+
                 first_seen TEXT NOT NULL,
                 last_seen TEXT NOT NULL,
 
@@ -90,29 +159,68 @@ class Store:
                 total_score REAL
             );
 
+            CREATE TABLE IF NOT EXISTS classification_cache (
+                key_sha TEXT PRIMARY KEY,
+                result_json TEXT NOT NULL,
+                created_at TEXT NOT NULL
+            );
+
             CREATE INDEX IF NOT EXISTS idx_places_last_seen ON places(last_seen);
             CREATE INDEX IF NOT EXISTS idx_places_primary_type ON places(primary_type);
             CREATE INDEX IF NOT EXISTS idx_places_rating ON places(rating);
             CREATE INDEX IF NOT EXISTS idx_places_website ON places(website);
+
+            -- Partial indexes for the candidate scans (enrichment + classification)
+            CREATE INDEX IF NOT EXISTS idx_places_needs_details
+                ON places(place_id) WHERE phone IS NULL OR maps_url IS NULL;
+            CREATE INDEX IF NOT EXISTS idx_places_for_classify
+                ON places(place_id) WHERE website IS NOT NULL;
+
+            -- Export reads only non-closed rows sorted by score; the partial
+            -- index lets the planner skip closed rows without a full scan.
+            CREATE INDEX IF NOT EXISTS idx_places_open_score
+                ON places(total_score DESC)
+                WHERE business_status IS NULL OR business_status != 'CLOSED_PERMANENTLY';
             """
         )
+
+        # DBs created before the hash columns existed: patch them in place
+        # (CREATE TABLE IF NOT EXISTS won't touch an existing table).
+        existing_cols = {r[1] for r in self.conn.execute("PRAGMA table_info(places)")}
+        for col in ("types_hash", "hours_hash"):
+            if col not in existing_cols:
+                self.conn.execute(f"ALTER TABLE places ADD COLUMN {col} INTEGER")
+
         self.conn.commit()
 
     # -----------------------------
     # Dedupe helpers
     # -----------------------------
+    def _load_temp_ids(self, ids: Sequence[str]) -> None:
+        """
+        Stage ids into the _touch_ids temp table so set operations can
+        join against it: one prepared statement regardless of id count,
+        instead of a freshly parsed IN (?,...) query per 800-id chunk.
+
+        Staging is DML, so callers must wrap the stage + query in
+        'with self.conn:' — otherwise the connection is left holding an
+        open write transaction (and the WAL write lock) after a read.
+        """
+        self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS _touch_ids(pid TEXT PRIMARY KEY)")
+        self.conn.execute("DELETE FROM _touch_ids")
+        self.conn.executemany("INSERT OR IGNORE INTO _touch_ids VALUES (?)", ((i,) for i in ids))
+
     def existing_place_ids(self, place_ids: Sequence[str]) -> Set[str]:
-        if not place_ids:
+        ids = list(place_ids)
+        if not ids:
             return set()
 
-        existing: Set[str] = set()
-        CHUNK = 800
-        for i in range(0, len(place_ids), CHUNK):
-            chunk = place_ids[i : i + CHUNK]
-            q = f"SELECT place_id FROM places WHERE place_id IN ({','.join(['?'] * len(chunk))})"
-            rows = self.conn.execute(q, chunk).fetchall()
-            existing.update(r["place_id"] for r in rows)
-        return existing
+        with self.conn:
+            self._load_temp_ids(ids)
+            rows = self.conn.execute(
+                "SELECT place_id FROM places WHERE place_id IN (SELECT pid FROM _touch_ids)"
+            ).fetchall()
+        return {r["place_id"] for r in rows}
 
     def touch_last_seen(self, place_ids: Iterable[str]) -> None:
         """
@@ -124,12 +232,13 @@ class Store:
             return
 
         now = _utc_now_iso()
-        CHUNK = 800
-        for i in range(0, len(ids), CHUNK):
-            chunk = ids[i : i + CHUNK]
-            q = f"UPDATE places SET last_seen=? WHERE place_id IN ({','.join(['?'] * len(chunk))})"
-            self.conn.execute(q, [now, *chunk])
-        self.conn.commit()
+        with self.conn:
+            self._load_temp_ids(ids)
+            self.conn.execute(
+                "UPDATE places SET last_seen=? "
+                "WHERE place_id IN (SELECT pid FROM _touch_ids)",
+                (now,),
+            )
 
     # -----------------------------
     # Core upsert
@@ -153,60 +262,94 @@ class Store:
         opening_hours_json: Optional[Dict[str, Any]] = None,
     ) -> None:
         now = _utc_now_iso()
-        types_json = json.dumps(types, ensure_ascii=False) if types is not None else None
-        hours_json = json.dumps(opening_hours_json, ensure_ascii=False) if opening_hours_json is not None else None
 
-        self.conn.execute(
-            """
-            INSERT INTO places (
-                place_id, name, address, phone, website, rating, review_count,
-                lat, lng, primary_type, types_json, business_status,
-                maps_url, opening_hours_json,
-                first_seen, last_seen
-            ) VALUES (
-                ?, ?, ?, ?, ?, ?, ?,
-                ?, ?, ?, ?, ?,
-                ?, ?,
-                ?, ?
+        types_bytes = orjson.dumps(types) if types is not None else None
+        hours_bytes = orjson.dumps(opening_hours_json) if opening_hours_json is not None else None
+        types_hash = _json_hash(types_bytes) if types_bytes is not None else None
+        hours_hash = _json_hash(hours_bytes) if hours_bytes is not None else None
+
+        # Re-scans mostly re-see identical types/hours; when the stored
+        # hash matches, send NULL so COALESCE keeps the existing column
+        # and the no-op JSON write (and WAL growth) is skipped.
+        if types_hash is not None or hours_hash is not None:
+            cur = self.conn.cursor()
+            cur.row_factory = None
+            stored = cur.execute(
+                "SELECT types_hash, hours_hash FROM places WHERE place_id=?",
+                (place_id,),
+            ).fetchone()
+            if stored is not None:
+                if types_hash is not None and stored[0] == types_hash:
+                    types_bytes = None
+                if hours_hash is not None and stored[1] == hours_hash:
+                    hours_bytes = None
+
+        with self.conn:
+            self.conn.execute(
+                _UPSERT_PLACE_SQL,
+                {
+                    "place_id": place_id,
+                    "name": name,
+                    "address": address,
+                    "phone": phone,
+                    "website": website,
+                    "rating": rating,
+                    "review_count": review_count,
+                    "lat": lat,
+                    "lng": lng,
+                    "primary_type": primary_type,
+                    "types_json": types_bytes.decode() if types_bytes is not None else None,
+                    "business_status": business_status,
+                    "maps_url": maps_url,
+                    "opening_hours_json": hours_bytes.decode() if hours_bytes is not None else None,
+                    "types_hash": types_hash,
+                    "hours_hash": hours_hash,
+                    "now": now,
+                },
+            )
+
+    def upsert_places_many(self, rows: Sequence[Dict[str, Any]]) -> None:
+        """
+        Bulk variant of upsert_place: one transaction, one executemany.
+
+        Each row is a dict of the upsert_place keyword fields plus "place_id".
+        Missing keys behave like None (COALESCE keeps existing values).
+        Amortizes the per-statement commit/fsync across the whole batch.
+        """
+        if not rows:
+            return
+
+        now = _utc_now_iso()
+        params: List[Dict[str, Any]] = []
+        for r in rows:
+            types = r.get("types")
+            hours = r.get("opening_hours_json")
+            types_bytes = orjson.dumps(types) if types is not None else None
+            hours_bytes = orjson.dumps(hours) if hours is not None else None
+            params.append(
+                {
+                    "place_id": r["place_id"],
+                    "name": r.get("name"),
+                    "address": r.get("address"),
+                    "phone": r.get("phone"),
+                    "website": r.get("website"),
+                    "rating": r.get("rating"),
+                    "review_count": r.get("review_count"),
+                    "lat": r.get("lat"),
+                    "lng": r.get("lng"),
+                    "primary_type": r.get("primary_type"),
+                    "types_json": types_bytes.decode() if types_bytes is not None else None,
+                    "business_status": r.get("business_status"),
+                    "maps_url": r.get("maps_url"),
+                    "opening_hours_json": hours_bytes.decode() if hours_bytes is not None else None,
+                    "types_hash": _json_hash(types_bytes) if types_bytes is not None else None,
+                    "hours_hash": _json_hash(hours_bytes) if hours_bytes is not None else None,
+                    "now": now,
+                }
             )
-            ON CONFLICT(place_id) DO UPDATE SET
-                last_seen = excluded.last_seen,
-
-                name = COALESCE(excluded.name, places.name),
-                address = COALESCE(excluded.address, places.address),
-                phone = COALESCE(excluded.phone, places.phone),
-                website = COALESCE(excluded.website, places.website),
-                rating = COALESCE(excluded.rating, places.rating),
-                review_count = COALESCE(excluded.review_count, places.review_count),
-                lat = COALESCE(excluded.lat, places.lat),
-                lng = COALESCE(excluded.lng, places.lng),
-                primary_type = COALESCE(excluded.primary_type, places.primary_type),
-                types_json = COALESCE(excluded.types_json, places.types_json),
-                business_status = COALESCE(excluded.business_status, places.business_status),
-                maps_url = COALESCE(excluded.maps_url, places.maps_url),
-                opening_hours_json = COALESCE(excluded.opening_hours_json, places.opening_hours_json)
-            ;
-            """,
-            (
-                place_id,
-                name,
-                address,
-                phone,
-                website,
-                rating,
-                review_count,
-                lat,
-                lng,
-                primary_type,
-                types_json,
-                business_status,
-                maps_url,
-                hours_json,
-                now,
-                now,
-            ),
-        )
-        self.conn.commit()
+
+        with self.conn:
+            self.conn.executemany(_UPSERT_PLACE_SQL, params)
 
     # -----------------------------
     # Google enrichment cache decision
@@ -214,27 +357,39 @@ class Store:
     def needs_details(self, place_id: str) -> bool:
         """
         v1: do NOT chase opening hours forever (often missing).
-        Only force details if missing call-ready essentials.
+        Only force details if missing call-ready essentials
+        (phone/maps_url); website is useful but optional for v1.
         """
-        row = self.conn.execute(
-            """
-            SELECT phone, maps_url, website
-            FROM places
-            WHERE place_id=?
-            """,
-            (place_id,),
-        ).fetchone()
+        # The missing-essentials test runs in SQL and comes back as one
+        # 0/1 column; a plain-tuple cursor skips sqlite3.Row wrapping.
+        cur = self.conn.cursor()
+        cur.row_factory = None
+        row = cur.execute(_NEEDS_DETAILS_SQL, (place_id,)).fetchone()
 
-        if row is None:
-            return True
-
-        if row["phone"] is None:
-            return True
-        if row["maps_url"] is None:
-            return True
+        return True if row is None else bool(row[0])
 
-        # website is useful but not required; keep it optional for v1
-        return False
+    def place_ids_needing_details(self, place_ids: Sequence[str]) -> List[str]:
+        """
+        Bulk needs_details: one chunked query instead of a point-SELECT
+        per id. Ids not present in the table need details too.
+        """
+        ids = list(place_ids)
+        if not ids:
+            return []
+
+        known: Set[str] = set()
+        need: Set[str] = set()
+        with self.conn:
+            self._load_temp_ids(ids)
+            for row in self.conn.execute(
+                "SELECT place_id, (phone IS NULL OR maps_url IS NULL) AS need "
+                "FROM places WHERE place_id IN (SELECT pid FROM _touch_ids)"
+            ):
+                known.add(row["place_id"])
+                if row["need"]:
+                    need.add(row["place_id"])
+
+        return [pid for pid in ids if pid not in known or pid in need]
 
     # -----------------------------
     # AI persistence + cache decision
@@ -254,47 +409,61 @@ class Store:
         ai_reason: str,
     ) -> None:
         now = _utc_now_iso()
-        self.conn.execute(
-            """
-            UPDATE places
-            SET
-                industry_bucket=?,
-                mobility_fit=?,
-                security_fit=?,
-                voip_fit=?,
-                fleet_attach=?,
-                signal_after_hours=?,
-                signal_dispatch=?,
-                signal_field_work=?,
-                ai_reason=?,
-                ai_last_updated=?
-            WHERE place_id=?
-            """,
-            (
-                industry_bucket,
-                int(mobility_fit),
-                int(security_fit),
-                int(voip_fit),
-                int(fleet_attach),
-                int(signal_after_hours),
-                int(signal_dispatch),
-                int(signal_field_work),
-                ai_reason[:400],
-                now,
-                place_id,
-            ),
-        )
-        self.conn.commit()
+        with self.conn:
+            self.conn.execute(
+                """
+                UPDATE places
+                SET
+                    industry_bucket=?,
+                    mobility_fit=?,
+                    security_fit=?,
+                    voip_fit=?,
+                    fleet_attach=?,
+                    signal_after_hours=?,
+                    signal_dispatch=?,
+                    signal_field_work=?,
+                    ai_reason=?,
+                    ai_last_updated=?
+                WHERE place_id=?
+                """,
+                (
+                    industry_bucket,
+                    int(mobility_fit),
+                    int(security_fit),
+                    int(voip_fit),
+                    int(fleet_attach),
+                    int(signal_after_hours),
+                    int(signal_dispatch),
+                    int(signal_field_work),
+                    ai_reason[:400],
+                    now,
+                    place_id,
+                ),
+            )
 
-    def get_ai_state(self, place_id: str) -> Optional[sqlite3.Row]:
-        return self.conn.execute(
-            """
-            SELECT website, ai_last_updated, mobility_fit, security_fit, voip_fit, fleet_attach
-            FROM places
-            WHERE place_id=?
-            """,
-            (place_id,),
+    # -----------------------------
+    # Classification result cache (OpenAI cost control)
+    # -----------------------------
+    def get_cached_classification(self, key_sha: str) -> Optional[str]:
+        """Return the cached result JSON for a cache key, or None on miss."""
+        row = self.conn.execute(
+            "SELECT result_json FROM classification_cache WHERE key_sha=?",
+            (key_sha,),
         ).fetchone()
+        return row["result_json"] if row else None
+
+    def put_cached_classification(self, key_sha: str, result_json: str) -> None:
+        with self.conn:
+            self.conn.execute(
+                """
+                INSERT OR REPLACE INTO classification_cache (key_sha, result_json, created_at)
+                VALUES (?, ?, ?)
+                """,
+                (key_sha, result_json, _utc_now_iso()),
+            )
+
+    def get_ai_state(self, place_id: str) -> Optional[sqlite3.Row]:
+        return self.conn.execute(_AI_STATE_SQL, (place_id,)).fetchone()
 
     def should_classify(self, place_id: str, current_website: Optional[str]) -> bool:
         row = self.get_ai_state(place_id)
@@ -313,13 +482,59 @@ class Store:
             return True
         return False
 
+    def should_classify_bulk(
+        self, items: Sequence[tuple[str, Optional[str]]]
+    ) -> Set[str]:
+        """
+        Bulk should_classify: (place_id, current_website) pairs in, the
+        subset of place_ids needing (re)classification out. One
+        temp-table join instead of a point SELECT per candidate.
+        """
+        ids = [pid for pid, _ in items]
+        if not ids:
+            return set()
+
+        with self.conn:
+            self._load_temp_ids(ids)
+            state = {
+                row["place_id"]: row
+                for row in self.conn.execute(
+                    "SELECT place_id, website, ai_last_updated, "
+                    "       mobility_fit, security_fit, voip_fit, fleet_attach "
+                    "FROM places WHERE place_id IN (SELECT pid FROM _touch_ids)"
+                )
+            }
+
+        out: Set[str] = set()
+        for pid, current_website in items:
+            row = state.get(pid)
+            if row is None or row["ai_last_updated"] is None:
+                out.add(pid)
+                continue
+            if any(
+                row[k] is None
+                for k in ("mobility_fit", "security_fit", "voip_fit", "fleet_attach")
+            ):
+                out.add(pid)
+                continue
+
+            stored_website = row["website"]
+            if current_website and stored_website and current_website != stored_website:
+                out.add(pid)
+            elif current_website and not stored_website:
+                out.add(pid)
+        return out
+
     # -----------------------------
     # Reads / exports
     # -----------------------------
     def fetch_rows_for_classification(self, limit: int = 50_000) -> List[sqlite3.Row]:
+        # Includes the scoring inputs (rating/review_count/hours) so callers
+        # don't need a second point-SELECT per classified row.
         return self.conn.execute(
             """
-            SELECT place_id, name, address, website, primary_type
+            SELECT place_id, name, address, website, primary_type,
+                   rating, review_count, opening_hours_json
             FROM places
             ORDER BY last_seen DESC
             LIMIT ?
@@ -328,15 +543,36 @@ class Store:
         ).fetchall()
 
     def upsert_score(self, place_id: str, total_score: float) -> None:
-        self.conn.execute(
-            "UPDATE places SET total_score=? WHERE place_id=?",
-            (float(total_score), place_id),
-        )
-        self.conn.commit()
+        with self.conn:
+            self.conn.execute(
+                "UPDATE places SET total_score=? WHERE place_id=?",
+                (float(total_score), place_id),
+            )
+
+    def upsert_scores_bulk(self, pairs: Iterable[tuple[str, float]]) -> None:
+        """
+        Bulk upsert_score: (place_id, total_score) pairs written in one
+        executemany transaction — one fsync for the whole scoring pass.
+        """
+        with self.conn:
+            self.conn.executemany(
+                "UPDATE places SET total_score=? WHERE place_id=?",
+                ((float(score), pid) for pid, score in pairs),
+            )
 
-    def fetch_export_rows(self) -> List[sqlite3.Row]:
+    def fetch_export_rows(self, order_by: str = "total_score DESC") -> sqlite3.Cursor:
+        """
+        Stream export rows, sorted in SQL (C-level) rather than in Python.
+
+        The default order matches idx_places_open_score (NULL scores sort
+        last under DESC), so the planner can walk the partial index instead
+        of filtering a full scan and sorting through a temp B-tree.
+
+        Returns the cursor so callers can iterate without materializing
+        the whole result set.
+        """
         return self.conn.execute(
-            """
+            f"""
             SELECT
               place_id, name, address, phone, website,
               rating, review_count, primary_type, business_status,
@@ -351,5 +587,6 @@ class Store:
               first_seen, last_seen
             FROM places
             WHERE business_status IS NULL OR business_status != 'CLOSED_PERMANENTLY'
+            ORDER BY {order_by}
             """
-        ).fetchall()
\ No newline at end of file
+        )
\ No newline at end of file
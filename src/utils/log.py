@@ -1,5 +1,8 @@
+import atexit
 import logging
+import queue
 import sys
+from logging.handlers import QueueHandler, QueueListener
 
 def setup_logging(level: str = "INFO") -> None:
     root = logging.getLogger()
@@ -14,4 +17,13 @@ def setup_logging(level: str = "INFO") -> None:
         datefmt="%Y-%m-%d %H:%M:%S",
     )
     handler.setFormatter(formatter)
-    root.addHandler(handler)
\ No newline at end of file
+
+    # Log calls only enqueue the record; a background listener thread
+    # owns the actual stdout write, so worker threads never serialize
+    # on the stream lock.
+    log_queue: queue.Queue = queue.Queue(-1)
+    listener = QueueListener(log_queue, handler)
+    listener.start()
+    atexit.register(listener.stop)
+
+    root.addHandler(QueueHandler(log_queue))
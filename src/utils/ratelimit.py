@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+import threading
+import time
+
+
+class RateLimiter:
+    """
+    Thread-safe token-bucket pacing for outbound API calls.
+
+    Call acquire() before each request; it blocks just long enough to keep
+    the observed request rate at or below `rate_per_second`. Safe to share
+    across worker threads (e.g. a ThreadPoolExecutor fanning out Places calls).
+    """
+
+    def __init__(self, rate_per_second: float) -> None:
+        if rate_per_second <= 0:
+            raise ValueError("rate_per_second must be > 0")
+        self._interval = 1.0 / float(rate_per_second)
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def acquire(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next_slot - now
+            if wait > 0:
+                self._next_slot += self._interval
+            else:
+                self._next_slot = now + self._interval
+        if wait > 0:
+            time.sleep(wait)